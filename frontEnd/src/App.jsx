@@ -6,6 +6,7 @@ import "./App.css";
 
 function App() {
   const [graphData, setGraphData] = useState(null);
+  const [textToken, setTextToken] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [successMessage, setSuccessMessage] = useState(null);
@@ -18,10 +19,12 @@ function App() {
     try {
       const result = await analyzeText(formData);
       setGraphData(result.analysis_result);
+      setTextToken(result.text_token);
       setSuccessMessage("Analysis completed successfully!");
     } catch (err) {
       setError(err.message || "Error processing analysis");
       setGraphData(null);
+      setTextToken(null);
     } finally {
       setLoading(false);
     }
@@ -29,6 +32,7 @@ function App() {
 
   const handleClear = () => {
     setGraphData(null);
+    setTextToken(null);
     setError(null);
     setSuccessMessage(null);
   };
@@ -42,6 +46,7 @@ function App() {
       />
       <GraphVisualization
         data={graphData}
+        textToken={textToken}
         loading={loading}
         error={error}
         successMessage={successMessage}
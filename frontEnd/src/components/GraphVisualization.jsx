@@ -3,7 +3,7 @@ import * as d3 from "d3";
 import { getAnalysisText } from "../utils/api";
 import "./GraphVisualization.css";
 
-function GraphVisualization({ data, loading, error, successMessage }) {
+function GraphVisualization({ data, textToken, loading, error, successMessage }) {
   const svgRef = useRef(null);
   const [hoveredNode, setHoveredNode] = useState(null);
   const [hoveredEdge, setHoveredEdge] = useState(null);
@@ -14,15 +14,15 @@ function GraphVisualization({ data, loading, error, successMessage }) {
   const [showTextPanel, setShowTextPanel] = useState(false);
 
   useEffect(() => {
-    if (data && !loading && successMessage) {
+    if (data && textToken && !loading && successMessage) {
       fetchAnalysisText();
     }
-  }, [data, loading, successMessage]);
+  }, [data, textToken, loading, successMessage]);
 
   const fetchAnalysisText = async () => {
     setLoadingText(true);
     try {
-      const result = await getAnalysisText();
+      const result = await getAnalysisText(textToken);
       setAnalysisText(result.text);
     } catch (err) {
       console.error("Erro ao buscar texto:", err);
@@ -251,7 +251,7 @@ function GraphVisualization({ data, loading, error, successMessage }) {
   return (
     <div className="graph-visualization">
       <div className="graph-header">
-        {data && (
+        {data && textToken && (
           <button
             className="btn-show-text"
             onClick={() => setShowTextPanel(!showTextPanel)}
@@ -300,7 +300,7 @@ function GraphVisualization({ data, loading, error, successMessage }) {
             </div>
           </div>
 
-          {showTextPanel && (
+          {showTextPanel && textToken && (
             <div className="text-panel">
               <div className="text-panel-header">
                 <h3>📝 Text analyzed</h3>
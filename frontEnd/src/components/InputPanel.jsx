@@ -164,7 +164,7 @@ function InputPanel({ onAnalyze, loading, onClear }) {
       ? [...DEFAULT_STOPWORDS, ...hiddenWords]
       : hiddenWords;
 
-    formData.append("hidden_words", JSON.stringify(allHiddenWords));
+    allHiddenWords.forEach((word) => formData.append("hidden_words", word));
 
     onAnalyze(formData);
   };
@@ -21,9 +21,10 @@ export async function analyzeText(formData) {
   }
 }
 
-export async function getAnalysisText() {
+export async function getAnalysisText(token) {
   try {
-    const response = await fetch(`${BACKEND_URL}/analysis/text`, {
+    const params = new URLSearchParams({ token });
+    const response = await fetch(`${BACKEND_URL}/analysis/text?${params}`, {
       method: "GET",
     });
 
@@ -1,18 +1,104 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from typing import Optional
-from phrase_net_core import run_phrase_net_analysis
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from phrase_net_core import compile_pattern, init_analysis_worker, run_phrase_net_analysis, stanza_uses_gpu
 from utils import extract_text_from_source
-import io
-import uvicorn
+import asyncio
+import functools
+import hashlib
 import json
-from starlette.concurrency import run_in_threadpool 
+import multiprocessing
+import os
+import secrets
+import uvicorn
+
+# --- Analysis Workers ---
+# The analysis is CPU-bound Python and NLP code, so it runs in worker processes
+# (each with its own preloaded pipelines) instead of threads sharing the GIL. Every
+# worker holds a copy of the NLP models, so the default stays small; raise it with
+# ANALYSIS_WORKERS on hosts with memory to spare.
+ANALYSIS_WORKERS = max(1, int(os.environ.get("ANALYSIS_WORKERS", min(2, max(1, (os.cpu_count() or 1) // 2)))))
+# torch and Numba thread pools inside each worker get an equal share of the cores.
+ANALYSIS_THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // ANALYSIS_WORKERS)
+# Only the first worker may load Stanza onto the GPU, so a single copy of its models is on
+# the device, and Stanza requests are routed to it. STANZA_USE_GPU=1 requires CUDA (startup
+# fails without it), STANZA_USE_GPU=0 keeps Stanza on CPU, and when unset CUDA is used if
+# available, like Stanza's own default.
+STANZA_USE_GPU = {"1": True, "0": False}.get(os.environ.get("STANZA_USE_GPU", ""))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One single-process executor per worker, so a text can be routed to the worker whose
+    # parse cache already holds it. 'spawn' avoids forking a process that already runs the
+    # event loop and PyTorch threads.
+    context = multiprocessing.get_context("spawn")
+    app.state.analysis_executors = []
+    # Tasks currently submitted to each worker; only touched from the event loop.
+    app.state.analysis_busy = [0] * ANALYSIS_WORKERS
+    try:
+        for index in range(ANALYSIS_WORKERS):
+            app.state.analysis_executors.append(ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=init_analysis_worker,
+                initargs=(ANALYSIS_THREADS_PER_WORKER, STANZA_USE_GPU if index == 0 else False),
+            ))
+        # Workers are spawned on demand; start all of them now so the NLP models are
+        # loaded before the first request instead of during it. A worker whose initializer
+        # fails breaks its executor here, which aborts startup.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, os.getpid) for executor in app.state.analysis_executors)
+        )
+        gpu_ready = await loop.run_in_executor(app.state.analysis_executors[0], stanza_uses_gpu)
+        app.state.stanza_gpu_worker = 0 if gpu_ready else None
+        yield
+    finally:
+        for executor in app.state.analysis_executors:
+            executor.shutdown(cancel_futures=True)
+
+
+def pick_analysis_worker(text: Optional[str] = None, nlp_tool: Optional[str] = None) -> int:
+    # Stanza requests go to the GPU worker when there is one. Otherwise a text goes to the
+    # same worker every time, so re-running it with other filtering options (or the other
+    # linking type) hits that worker's parse cache, unless that worker is busy while
+    # another one is idle. Tasks without a text (PDF pages) go to the least busy worker.
+    if nlp_tool == "stanza" and app.state.stanza_gpu_worker is not None:
+        return app.state.stanza_gpu_worker
+
+    busy = app.state.analysis_busy
+    if text is None:
+        return busy.index(min(busy))
+
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    index = int.from_bytes(digest[:8], "big") % len(busy)
+    if busy[index] and 0 in busy:
+        return busy.index(0)
+    return index
+
+
+async def run_in_analysis_worker(func, *args, text: Optional[str] = None, nlp_tool: Optional[str] = None):
+    index = pick_analysis_worker(text, nlp_tool)
+    busy = app.state.analysis_busy
+    busy[index] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            app.state.analysis_executors[index], func, *args
+        )
+    finally:
+        busy[index] -= 1
+
 
 app = FastAPI(
     title="Phrase Net Backend (Híbrido)",
     description="API para análise de texto com Phrase Nets. Permite a escolha entre SpaCy (Rápido) e Stanza (Robusto).",
+    lifespan=lifespan,
 )
 
 # --- CORS Settings ---
@@ -24,6 +110,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Analysed texts store ---
+# Recent texts are kept per analysis token so concurrent clients don't overwrite each
+# other. Only touched from the event loop, so no lock is needed. Texts longer than
+# ANALYSIS_TEXT_MAX_CHARS are still analysed but not stored (no token is issued).
+ANALYSIS_TEXTS_MAX_ENTRIES = 8
+ANALYSIS_TEXT_MAX_CHARS = 2_000_000
+analysis_texts: "OrderedDict[str, str]" = OrderedDict()
+
+
+def store_analysis_text(text: str) -> Optional[str]:
+    if len(text) > ANALYSIS_TEXT_MAX_CHARS:
+        return None
+
+    token = secrets.token_urlsafe(8)
+    analysis_texts[token] = text
+    while len(analysis_texts) > ANALYSIS_TEXTS_MAX_ENTRIES:
+        analysis_texts.popitem(last=False)
+    return token
+
+
 # --- Parameters Validation ---
 
 def validate_linking_params(
@@ -56,6 +162,12 @@ def validate_linking_params(
             detail="O Orthographic Linking requer que o campo 'pattern' (regex) seja preenchido.",
         )
 
+    if linking_type == "orthographic":
+        try:
+            compile_pattern(pattern)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     if linking_type == "syntactic" and pattern:
         print(
             "Warning: The pattern will be ignored, as Syntactic Linking uses the dependency parser."
@@ -64,23 +176,42 @@ def validate_linking_params(
     return {"linking_type": linking_type, "pattern": pattern, "nlp_tool": nlp_tool}
 
 
-# --- GET for text analysis ---
+def parse_hidden_words(hidden_words: List[str]) -> List[str]:
+    # Older clients send the whole list as a single JSON-encoded field ('["a", "b"]').
+    if len(hidden_words) == 1 and hidden_words[0].lstrip().startswith("["):
+        try:
+            words = json.loads(hidden_words[0])
+        except ValueError:
+            words = None
 
-@app.get("/analysis/text")
-async def get_analysis_text():
-    try:
-        if hasattr(get_analysis_text, "last_text") and get_analysis_text.last_text:
-            return {
-                "status": "success",
-                "text": get_analysis_text.last_text,
-                "length": len(get_analysis_text.last_text),
-            }
-        else:
+        if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
             raise HTTPException(
-                status_code=404, detail="Nenhum texto foi analisado ainda"
+                status_code=422,
+                detail="'hidden_words' deve ser uma lista JSON de strings ou um campo por palavra.",
             )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao recuperar texto: {e}")
+        return words
+
+    return hidden_words
+
+
+# --- GET for text analysis ---
+
+@app.get("/analysis/text")
+async def get_analysis_text(
+    token: str = Query(..., description="Token returned by POST /analyze."),
+):
+    text = analysis_texts.get(token)
+    if text is None:
+        raise HTTPException(
+            status_code=404, detail="Nenhum texto encontrado para este token"
+        )
+
+    analysis_texts.move_to_end(token)
+    return {
+        "status": "success",
+        "text": text,
+        "length": len(text),
+    }
 
 
 # --- Health Check route ---
@@ -105,16 +236,22 @@ async def analyze_text(
         100,
         description="Maximum number of nodes to retain after filtering (Section 3.2).",
     ),
-    hidden_words: Optional[str] = Form("[]"),
+    hidden_words: List[str] = Form(
+        [], description="Words to hide from the graph, one form field per word."
+    ),
 ):
 
+    stopwords = parse_hidden_words(hidden_words)
+
     raw_text = ""
     if text_content:
         raw_text = text_content
     elif file:
         try:
-            file_stream = io.BytesIO(await file.read())
-            raw_text = await extract_text_from_source(file_stream, file.filename)
+            # UploadFile is already spooled (memory for small uploads, disk for large ones).
+            raw_text = await extract_text_from_source(
+                file.file, file.filename, run_in_analysis_worker, ANALYSIS_WORKERS
+            )
         except IOError as e:
             raise HTTPException(status_code=422, detail=str(e))
     else:
@@ -124,29 +261,25 @@ async def analyze_text(
 
     if not raw_text.strip():
         raise HTTPException(status_code=400, detail="The extracted text is empty.")
-    
-    get_analysis_text.last_text = raw_text
-
-    # --- Stopwords parsing ---
-    try:
-        stopwords_list = json.loads(hidden_words) if hidden_words else []
-        if not isinstance(stopwords_list, list) or not all(isinstance(w, str) for w in stopwords_list):
-             stopwords_list = []
-    except json.JSONDecodeError:
-        stopwords_list = []
 
     try:
-        result = await run_in_threadpool(
-            run_phrase_net_analysis,
-            raw_text=raw_text,
-            linking_type=linking_params["linking_type"],
-            nlp_tool=linking_params["nlp_tool"], # NOVO PARÂMETRO
-            pattern=linking_params["pattern"],
-            max_nodes=max_nodes,
-            stopwords=stopwords_list,
+        result = await run_in_analysis_worker(
+            functools.partial(
+                run_phrase_net_analysis,
+                raw_text=raw_text,
+                linking_type=linking_params["linking_type"],
+                nlp_tool=linking_params["nlp_tool"], # NOVO PARÂMETRO
+                pattern=linking_params["pattern"],
+                max_nodes=max_nodes,
+                stopwords=stopwords,
+            ),
+            text=raw_text,
+            nlp_tool=linking_params["nlp_tool"],
         )
 
-        return {"status": "success", "analysis_result": result}
+        # Only successful analyses take a slot in the text store.
+        text_token = store_analysis_text(raw_text)
+        return {"status": "success", "analysis_result": result, "text_token": text_token}
 
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"NLP dependency error: {e}")
@@ -1,309 +1,656 @@
-import networkx as nx
+import hashlib
+import numpy as np
+import os
 import re
 import spacy
 import stanza
-from collections import Counter
-from itertools import combinations
-from typing import List, Optional
+import threading
+import torch
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain
+from scipy import sparse
+from spacy.attrs import DEP, HEAD, IS_PUNCT, IS_SPACE, IS_STOP, LEMMA
+from typing import AbstractSet, DefaultDict, Dict, Iterable, List, Optional, Pattern, Tuple
+
+# Numba compiles the co-occurrence kernel to a parallel native loop when installed;
+# otherwise the NumPy implementation is used.
+try:
+    from numba import config as numba_config, njit, prange, set_num_threads as set_numba_threads
+except ImportError:
+    njit = None
+
+# google-re2 matches in linear time, so user-supplied patterns can't trigger
+# catastrophic backtracking. Falls back to the standard library engine.
+try:
+    import re2 as pattern_engine
+except ImportError:
+    pattern_engine = re
 
 # --- NLP Global Settings ---
 NLP_CONFIG = {
-    'tool_name': None,
-    'pipeline': None
+    'pipelines': {}
 }
 
-def load_nlp_pipeline(tool_name: str):
+# Each tool is loaded once, with everything syntactic linking needs, and shared by both
+# linking types; orthographic parses skip the dependency parser per call instead of
+# keeping a second copy of the models in memory.
+# The tagger/attribute_ruler stay enabled because the rule-based lemmatizer relies on POS tags.
+SPACY_DISABLED_COMPONENTS = {
+    'orthographic': ['parser', 'ner'],
+    'syntactic': ['ner'],
+}
 
-    global NLP_CONFIG
-    
-    if NLP_CONFIG['tool_name'] == tool_name and NLP_CONFIG['pipeline'] is not None:
-        return
+STANZA_PROCESSORS = {
+    'orthographic': 'tokenize,mwt,pos,lemma',
+    'syntactic': 'tokenize,mwt,pos,lemma,depparse',
+}
 
-    NLP_CONFIG['tool_name'] = tool_name
-    
-    if tool_name == 'spacy':
-        try:
-            print("Carregando SpaCy...")
-            NLP_CONFIG['pipeline'] = spacy.load('en_core_web_sm')
-        except OSError:
-            raise RuntimeError("Modelo 'en_core_web_sm' do SpaCy não encontrado. Execute 'python -m spacy download en_core_web_sm'.")
-    
-    elif tool_name == 'stanza':
-        try:
-            print("Carregando Stanza...")
-            NLP_CONFIG['pipeline'] = stanza.Pipeline(
-                lang='en', 
-                processors='tokenize,mwt,pos,lemma,depparse', 
-                verbose=False, 
-                download_method=None
-            )
-        except Exception as e:
-            raise RuntimeError(f"Erro ao carregar Stanza. Verifique a instalação: {e}")
-    
-    else:
-        raise ValueError("Ferramenta NLP inválida. Use 'spacy' ou 'stanza'.")
+# Paragraph chunks are processed with Stanza's bulk_process; larger batches amortize
+# model calls across paragraphs.
+STANZA_BATCH_SIZES = {
+    'tokenize_batch_size': 64,
+    'lemma_batch_size': 64,
+}
 
+# Stanza's neural models run on CUDA only in a worker started with use_gpu (see
+# init_analysis_worker), with bigger batches to keep the GPU busy. Stanza has no
+# half-precision mode, so matmuls are only allowed to use TF32.
+STANZA_USE_GPU = False
+STANZA_GPU_BATCH_SIZES = {
+    'tokenize_batch_size': 128,
+    'lemma_batch_size': 128,
+}
 
-def _preprocess_text(text: str) -> str:
-    return text.lower().strip()
+# Large inputs are split on blank lines and streamed through the pipeline in batches.
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+SPACY_BATCH_SIZE = 64
+SPACY_N_PROCESS = max(1, (os.cpu_count() or 1) // 2)
+# Worker processes reload the model, so they only pay off on long documents.
+SPACY_MULTIPROCESS_MIN_CHUNKS = 512
 
+# Sliding window used by orthographic linking to detect co-occurring lemmas.
+WINDOW_SIZE = 5
+# Up to this many vocabulary pairs, co-occurrences are summed in a dense array.
+DENSE_COOCCURRENCE_MAX_CELLS = 4_000_000
 
-def _orthographic_linking(text: str, pattern: str, stopwords: List[str]) -> nx.DiGraph:
-    graph = nx.DiGraph()
-    nlp = NLP_CONFIG['pipeline']
-    tool = NLP_CONFIG['tool_name']
-    stopwords_set = set(stopwords)
+RELEVANT_DEPS = frozenset({"nsubj", "obj", "iobj", "conj", "acl", "advcl"})
 
-    lemmas = []
-    
-    if not nlp:
-        tokens = re.findall(r"\b\w+\b", text.lower())
-        lemmas = [w for w in tokens if w not in stopwords_set]
-    else:
-        doc = nlp(text)
-        if tool == 'spacy':
-            lemmas = [token.lemma_.lower() for token in doc 
-                      if not token.is_punct and not token.is_space and not token.is_stop and token.lemma_.lower() not in stopwords_set]
-        elif tool == 'stanza':
-            lemmas = [word.lemma.lower() for sent in doc.sentences for word in sent.words 
-                      if word.upos not in ("PUNCT", "SPACE") and word.lemma.lower() not in stopwords_set]
-    
-    token_frequency = Counter(lemmas)
+# Parsed tokens of recently analysed texts, so re-running the same text with other
+# filtering options skips the NLP pipeline. Lives until the process restarts.
+PARSE_CACHE_SIZE = 32
+_PARSE_CACHE: "OrderedDict[Tuple[str, str, str], tuple]" = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
 
-    for token, freq in token_frequency.items():
-        graph.add_node(token, frequency=freq)
+# Lowercased lemmas shared across parses in the same process; lemma frequencies are
+# Zipfian, so the common ones are lowercased once per worker instead of once per text.
+LEMMA_CACHE_SIZE = 200_000
 
-    window_size = 5
-    for i in range(len(lemmas) - window_size + 1):
-        window = lemmas[i:i + window_size]
-        for node1, node2 in combinations(set(window), 2):
-            if node1 != node2:
-                if graph.has_edge(node1, node2):
-                    graph[node1][node2]["weight"] += 1
-                else:
-                    graph.add_edge(node1, node2, weight=1)
-                    
-    return graph
 
+def load_nlp_pipeline(tool_name: str):
 
-def _syntactic_linking(text: str, stopwords: List[str]) -> nx.DiGraph:
-    nlp = NLP_CONFIG['pipeline']
-    tool = NLP_CONFIG['tool_name']
-    stopwords_set = set(stopwords)
+    # Loaded lazily on first use; the same pipeline serves both linking types.
+    pipeline = NLP_CONFIG['pipelines'].get(tool_name)
+
+    if pipeline is None:
+        if tool_name == 'spacy':
+            try:
+                print("Carregando SpaCy...")
+                pipeline = spacy.load('en_core_web_sm', disable=SPACY_DISABLED_COMPONENTS['syntactic'])
+            except OSError:
+                raise RuntimeError("Modelo 'en_core_web_sm' do SpaCy não encontrado. Execute 'python -m spacy download en_core_web_sm'.")
+
+        elif tool_name == 'stanza':
+            try:
+                print("Carregando Stanza...")
+                batch_sizes = dict(STANZA_BATCH_SIZES)
+                if STANZA_USE_GPU:
+                    torch.set_float32_matmul_precision('high')
+                    batch_sizes.update(STANZA_GPU_BATCH_SIZES)
+                pipeline = stanza.Pipeline(
+                    lang='en', 
+                    processors=STANZA_PROCESSORS['syntactic'], 
+                    verbose=False, 
+                    download_method=None,
+                    use_gpu=STANZA_USE_GPU,
+                    **batch_sizes
+                )
+            except Exception as e:
+                raise RuntimeError(f"Erro ao carregar Stanza. Verifique a instalação: {e}")
+
+        else:
+            raise ValueError("Ferramenta NLP inválida. Use 'spacy' ou 'stanza'.")
+
+        NLP_CONFIG['pipelines'][tool_name] = pipeline
+
+    return pipeline
+
+
+def init_analysis_worker(num_threads: int = 1, use_gpu: Optional[bool] = False):
+    # Runs once in each analysis worker process. The worker is already one of several
+    # processes, so spaCy must not start its own pool on top of it and the torch/Numba
+    # thread pools are capped to the worker's share of the cores.
+    global SPACY_N_PROCESS, STANZA_USE_GPU
+    SPACY_N_PROCESS = 1
+    torch.set_num_threads(num_threads)
+    if njit is not None:
+        # Numba rejects more threads than its pool was sized for at import.
+        set_numba_threads(min(num_threads, numba_config.NUMBA_NUM_THREADS))
+
+    # use_gpu=None picks CUDA when it is available (Stanza's own default); True requires it.
+    if use_gpu is None:
+        use_gpu = torch.cuda.is_available()
+    elif use_gpu and not torch.cuda.is_available():
+        raise RuntimeError("Stanza foi configurado para usar a GPU, mas nenhuma GPU CUDA está disponível.")
+    STANZA_USE_GPU = use_gpu
+
+    for tool_name in ('spacy', 'stanza'):
+        try:
+            load_nlp_pipeline(tool_name)
+        except RuntimeError as e:
+            # A GPU load failure (e.g. CUDA out of memory) must stop the server instead
+            # of failing every Stanza request later.
+            if tool_name == 'stanza' and STANZA_USE_GPU:
+                raise
+            # Leave it to the request to report the missing model.
+            print(f"Aviso: {e}")
+
+    # Trigger Numba's compilation (or cache load) before the first request.
+    _count_cooccurrences(np.arange(WINDOW_SIZE, dtype=np.int64), WINDOW_SIZE, WINDOW_SIZE)
+
+
+def stanza_uses_gpu() -> bool:
+    return STANZA_USE_GPU
+
+
+# --- Graph Structure ---
+
+@dataclass
+class PhraseNet:
+    # Nodes are small integer ids into `labels`, so every stage hashes ints instead of
+    # strings; words are only looked up again when serializing. Node frequencies double
+    # as the node set; edges are stored as outgoing weight counters plus per-node in/out
+    # weight totals kept in sync by add_edge.
+    labels: List[str] = field(default_factory=list)
+    freq: Counter = field(default_factory=Counter)
+    out: DefaultDict[int, Counter] = field(default_factory=lambda: defaultdict(Counter))
+    out_sum: Counter = field(default_factory=Counter)
+    in_sum: Counter = field(default_factory=Counter)
+    rel: Dict[Tuple[int, int], str] = field(default_factory=dict)
+    groups: Dict[int, List[int]] = field(default_factory=dict)
+
+    def add_edge(self, u: int, v: int, weight: int = 1, relation: Optional[str] = None):
+        self.out[u][v] += weight
+        self.out_sum[u] += weight
+        self.in_sum[v] += weight
+        if relation is not None:
+            self.rel.setdefault((u, v), relation)
+
+    def add_weighted_edges_from(self, edges: Iterable[Tuple[int, int, int]]):
+        # Bulk insert of already aggregated edges: weight totals are accumulated in plain
+        # dicts and merged into the Counters once.
+        out = self.out
+        out_totals = defaultdict(int)
+        in_totals = defaultdict(int)
+        for u, v, weight in edges:
+            out[u][v] += weight
+            out_totals[u] += weight
+            in_totals[v] += weight
+        self.out_sum.update(out_totals)
+        self.in_sum.update(in_totals)
+
+    def edges(self) -> Iterable[Tuple[int, int, int]]:
+        for u, targets in self.out.items():
+            for v, weight in targets.items():
+                yield u, v, weight
+
+    def predecessors(self) -> DefaultDict[int, set]:
+        preds = defaultdict(set)
+        for u, v, _ in self.edges():
+            preds[v].add(u)
+        return preds
+
+    def subgraph(self, nodes: Iterable[int], drop_isolates: bool = False) -> "PhraseNet":
+        # Builds the induced network directly from the kept nodes' outgoing edges.
+        keep = set(nodes)
+        kept = [node for node in self.freq if node in keep]
+        out = self.out
+        edges = [
+            (u, v, weight) for u in kept if u in out for v, weight in out[u].items() if v in keep
+        ]
+        sub = PhraseNet(labels=self.labels)
+        sub.add_weighted_edges_from(edges)
+        if self.rel:
+            rel = self.rel
+            sub.rel = {(u, v): rel[u, v] for u, v, _ in edges if (u, v) in rel}
+        for node in kept:
+            if drop_isolates and node not in sub.out_sum and node not in sub.in_sum:
+                continue
+            sub.freq[node] = self.freq[node]
+            if node in self.groups:
+                sub.groups[node] = self.groups[node]
+        return sub
+
+
+def compile_pattern(pattern: str) -> Pattern:
+    try:
+        return pattern_engine.compile(pattern)
+    except Exception as e:
+        raise ValueError(f"Invalid pattern '{pattern}': {e}")
 
-    if not nlp:
-        raise RuntimeError(f"Ferramenta NLP ({tool}) não carregada. Não é possível rodar Syntactic Linking.")
 
-    graph = nx.DiGraph()
-    doc = nlp(text)
-    RELEVANT_DEPS = ["nsubj", "obj", "iobj", "conj", "acl", "advcl"]
+def _preprocess_text(text: str) -> str:
+    return text.lower().strip()
 
-    lemmas = []
+
+def _split_into_chunks(text: str) -> List[str]:
+    chunks = [chunk.strip() for chunk in PARAGRAPH_SPLIT_RE.split(text)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def _parse_documents(nlp, tool: str, linking_type: str, text: str) -> list:
+    chunks = _split_into_chunks(text)
+    if not chunks:
+        return []
+
+    # Chunk order is preserved so the token sequence matches the original text.
     if tool == 'spacy':
-        lemmas = [token.lemma_.lower() for token in doc if not token.is_punct and not token.is_space and not token.is_stop]
+        n_process = SPACY_N_PROCESS if len(chunks) >= SPACY_MULTIPROCESS_MIN_CHUNKS else 1
+        return list(nlp.pipe(
+            chunks,
+            batch_size=SPACY_BATCH_SIZE,
+            n_process=n_process,
+            disable=SPACY_DISABLED_COMPONENTS[linking_type],
+        ))
     elif tool == 'stanza':
-        for sent in doc.sentences:
-            for word in sent.words:
-                if word.upos not in ("PUNCT", "SPACE"):
-                    lemmas.append(word.lemma.lower())
-    
-    token_frequency = Counter(lemmas)
-    
-    if tool == 'spacy':
-        for token in doc:
-            if token.dep_ in RELEVANT_DEPS and not token.is_punct and not token.is_space:
-                head = token.head
-                
-                node_from = head.lemma_.lower()
-                node_to = token.lemma_.lower()
-                relation_type = token.dep_
-                
-                if (node_from != node_to and 
-                    node_from not in stopwords_set and node_to not in stopwords_set and
-                    not head.is_punct and not head.is_space):
-                    
-                    for node in [node_from, node_to]:
-                        if not graph.has_node(node):
-                             graph.add_node(node, frequency=token_frequency.get(node, 1))
-
-                    if graph.has_edge(node_from, node_to):
-                        graph[node_from][node_to]['weight'] += 1
-                    else:
-                        graph.add_edge(node_from, node_to, weight=1, relation=relation_type)
+        return nlp.bulk_process(
+            [stanza.Document([], text=chunk) for chunk in chunks],
+            processors=STANZA_PROCESSORS[linking_type],
+        )
 
-    elif tool == 'stanza':
-        for sentence in doc.sentences:
-            word_map = {i + 1: word for i, word in enumerate(sentence.words)}
-            
-            for word in sentence.words:
-                if word.head > 0 and word.deprel in RELEVANT_DEPS:
-                    head_word = word_map.get(word.head)
-                    
-                    if head_word and word.upos != 'PUNCT' and head_word.upos != 'PUNCT':
-                        node_from = head_word.lemma.lower()
-                        node_to = word.lemma.lower()
-                        relation_type = word.deprel
-                        
-                        if (node_from != node_to and 
-                            node_from not in stopwords_set and node_to not in stopwords_set):
-                            
-                            for node in [node_from, node_to]:
-                                if not graph.has_node(node):
-                                    graph.add_node(node, frequency=token_frequency.get(node, 1))
-
-                            if graph.has_edge(node_from, node_to):
-                                graph[node_from][node_to]["weight"] += 1
-                            else:
-                                graph.add_edge(node_from, node_to, weight=1, relation=relation_type)
-
-    return graph
+    raise ValueError("Ferramenta NLP inválida. Use 'spacy' ou 'stanza'.")
 
 
-def _filter_network(
-    graph: nx.DiGraph, max_nodes: int, stopwords: Optional[List[str]] = None
-) -> nx.DiGraph:
-    
-    if stopwords is None:
-        stopwords = []
+# Windows only change their set of words when a token enters or leaves, so each pair of
+# positions less than a window apart is credited with the run of windows in which both
+# tokens are the first occurrence of their word. This counts every distinct pair once
+# per window without materialising the windows. Pairs are ordered (lower id, higher id).
 
-    stopwords_set = set(w.lower() for w in stopwords)
-    
-    node_scores = {}
-    nodes_to_remove = []
-    for node in graph.nodes():
-        if node.lower() in stopwords_set:
-            nodes_to_remove.append(node)
-            continue
-        
-        score = (
-            sum(data["weight"] for _, _, data in graph.edges(node, data=True))
-            + sum(data["weight"] for _, _, data in graph.in_edges(node, data=True))
+def _pair_spans_numpy(
+    ids: np.ndarray, previous: np.ndarray, window_size: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    num_tokens = len(ids)
+    num_windows = num_tokens - window_size + 1
+
+    rows, cols, counts = [], [], []
+    for offset in range(1, window_size):
+        first = np.arange(num_tokens - offset)
+        second = first + offset
+        # Token pairs `offset` apart are aligned slices, i.e. views rather than gathered copies.
+        first_ids, second_ids = ids[:-offset], ids[offset:]
+
+        start = np.maximum(
+            np.maximum(second - window_size + 1, 0),
+            np.maximum(previous[:-offset], previous[offset:]) + 1,
         )
-        node_scores[node] = score
+        end = np.minimum(first, num_windows - 1)
+        span = end - start + 1
+
+        valid = (span > 0) & (first_ids != second_ids)
+        first_ids = first_ids[valid]
+        second_ids = second_ids[valid]
+        rows.append(np.minimum(first_ids, second_ids))
+        cols.append(np.maximum(first_ids, second_ids))
+        counts.append(span[valid].astype(np.int32))
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(counts)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _pair_spans_numba(ids, previous, window_size):
+        num_tokens = ids.shape[0]
+        num_windows = num_tokens - window_size + 1
+        pairs_per_token = window_size - 1
+
+        rows = np.empty(num_tokens * pairs_per_token, dtype=np.int64)
+        cols = np.empty(num_tokens * pairs_per_token, dtype=np.int64)
+        counts = np.zeros(num_tokens * pairs_per_token, dtype=np.int32)
+
+        for first in prange(num_tokens):
+            for offset in range(1, window_size):
+                second = first + offset
+                if second >= num_tokens:
+                    break
+
+                start = max(max(second - window_size + 1, 0), max(previous[first], previous[second]) + 1)
+                end = min(first, num_windows - 1)
+                a, b = ids[first], ids[second]
+                if end >= start and a != b:
+                    slot = first * pairs_per_token + offset - 1
+                    rows[slot] = min(a, b)
+                    cols[slot] = max(a, b)
+                    counts[slot] = end - start + 1
+
+        valid = counts > 0
+        return rows[valid], cols[valid], counts[valid]
+
+
+def _count_cooccurrences(
+    ids: np.ndarray, vocab_size: int, window_size: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Returns (source ids, target ids, counts) with one entry per distinct pair.
+    num_tokens = len(ids)
+    num_windows = num_tokens - window_size + 1
+    if num_windows <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    # Position of the previous occurrence of the same token (-1 for the first one).
+    order = np.argsort(ids, kind="stable")
+    repeated = ids[order[1:]] == ids[order[:-1]]
+    previous = np.full(num_tokens, -1, dtype=np.int64)
+    previous[order[1:][repeated]] = order[:-1][repeated]
+
+    if njit is not None:
+        rows, cols, counts = _pair_spans_numba(ids, previous, window_size)
+    else:
+        rows, cols, counts = _pair_spans_numpy(ids, previous, window_size)
 
-    temp_graph = graph.copy()
-    temp_graph.remove_nodes_from(nodes_to_remove)
+    # Small vocabularies are summed in a dense histogram, which beats sparse coalescing.
+    if vocab_size * vocab_size <= DENSE_COOCCURRENCE_MAX_CELLS:
+        totals = np.bincount(rows * vocab_size + cols, weights=counts, minlength=vocab_size * vocab_size)
+        cells = np.flatnonzero(totals)
+        return cells // vocab_size, cells % vocab_size, totals[cells].astype(np.int64)
+
+    matrix = sparse.coo_matrix((counts, (rows, cols)), shape=(vocab_size, vocab_size)).tocsr().tocoo()
+    return matrix.row, matrix.col, matrix.data
 
-    sorted_nodes = sorted(node_scores.items(), key=lambda item: item[1], reverse=True)
-    
-    selected_nodes = []
-    idx = 0
-    
-    while len(selected_nodes) < max_nodes and idx < len(sorted_nodes):
-        node, score = sorted_nodes[idx]
-        idx += 1
-        
-        if not node.startswith("SUPER_NODE:"):
-            selected_nodes.append(node)
-        
-    while len(selected_nodes) < max_nodes and idx < len(sorted_nodes):
-        node, score = sorted_nodes[idx]
-        idx += 1
-        selected_nodes.append(node)
-
-    filtered_graph = temp_graph.subgraph(selected_nodes).copy()
-    
-    filtered_graph.remove_nodes_from(list(nx.isolates(filtered_graph)))
-    
-    return filtered_graph
 
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _norm(lemma: str) -> str:
+    return lemma.lower()
 
-def _compress_edges(graph: nx.DiGraph) -> nx.DiGraph:
 
-    if not graph.nodes:
-        return graph
+class _LowercaseCache(dict):
+    # Lemmas repeat a lot, so each distinct one is resolved and lowercased once per
+    # parse instead of allocating a new string for every token. Misses fall back to the
+    # process-wide _norm cache.
+    def __init__(self, resolve=str):
+        super().__init__()
+        self.resolve = resolve
 
-    equivalent_nodes = []
-    nodes_to_check = set(graph.nodes())
+    def __missing__(self, key):
+        value = self[key] = _norm(self.resolve(key))
+        return value
 
-    while nodes_to_check:
-        node = nodes_to_check.pop()
-        group = {node}
-        in_neighbors = set(graph.predecessors(node))
-        out_neighbors = set(graph.successors(node))
 
-        for other_node in list(nodes_to_check):
-            if (
-                set(graph.predecessors(other_node)) == in_neighbors
-                and set(graph.successors(other_node)) == out_neighbors
+def _extract_tokens(
+    docs: list, tool: str, with_dependencies: bool
+) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+    # Lemmas and dependency triples are collected in the same sweep over the parsed
+    # documents, lowercasing each distinct lemma only once.
+    lemmas = []
+    dependencies = []
+    if not docs:
+        return lemmas, dependencies
+
+    if tool == 'spacy':
+        # Bulk-export lemma hashes, flags and dependency arcs instead of reading token
+        # attributes one by one. HEAD is exported as an offset from the token.
+        strings = docs[0].vocab.strings
+        lower = _LowercaseCache(strings.__getitem__)
+        relevant_deps = {strings[dep]: dep for dep in RELEVANT_DEPS}
+        relevant_dep_hashes = np.fromiter(relevant_deps, dtype=np.uint64, count=len(relevant_deps))
+        for doc in docs:
+            attrs = doc.to_array([LEMMA, IS_PUNCT, IS_SPACE, IS_STOP, DEP, HEAD])
+            content = (attrs[:, 1] == 0) & (attrs[:, 2] == 0)
+            lemmas.extend(lower[lemma_hash] for lemma_hash in attrs[content & (attrs[:, 3] == 0), 0].tolist())
+
+            if not with_dependencies:
+                continue
+            heads = np.arange(len(attrs)) + attrs[:, 5].astype(np.int64)
+            linked = content & content[heads] & np.isin(attrs[:, 4], relevant_dep_hashes)
+            doc_lemmas = attrs[:, 0].tolist()
+            for token_idx, head_idx, dep_hash in zip(
+                np.flatnonzero(linked).tolist(), heads[linked].tolist(), attrs[linked, 4].tolist()
             ):
-                group.add(other_node)
-                nodes_to_check.remove(other_node)
+                node_from = lower[doc_lemmas[head_idx]]
+                node_to = lower[doc_lemmas[token_idx]]
+                if node_from != node_to:
+                    dependencies.append((node_from, node_to, relevant_deps[dep_hash]))
+
+    elif tool == 'stanza':
+        lower = _LowercaseCache()
+        add_dependency = dependencies.append
+        for sentence in chain.from_iterable(doc.sentences for doc in docs):
+            words = sentence.words
+            # Word attributes are properties on Stanza objects, so each one is read once
+            # into parallel lists that heads can index into.
+            sentence_lemmas = [lower[word.lemma] for word in words]
+            sentence_upos = [word.upos for word in words]
+            lemmas.extend(
+                lemma for lemma, upos in zip(sentence_lemmas, sentence_upos) if upos != "PUNCT" and upos != "SPACE"
+            )
+
+            if not with_dependencies:
+                continue
+            for word, lemma, upos in zip(words, sentence_lemmas, sentence_upos):
+                head, deprel = word.head, word.deprel
+                if head > 0 and upos != "PUNCT" and deprel in RELEVANT_DEPS:
+                    head_lemma = sentence_lemmas[head - 1]
+                    if sentence_upos[head - 1] != "PUNCT" and head_lemma != lemma:
+                        add_dependency((head_lemma, lemma, deprel))
+
+    return lemmas, dependencies
+
+
+def _parse_to_tokens(nlp, tool: str, linking_type: str, text: str) -> tuple:
+    # Returns (lemmas, dependency triples); user stopwords are applied later, so the
+    # result only depends on the text, the tool and the linking type.
+    text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    key = (text_hash, tool, linking_type)
+
+    with _PARSE_CACHE_LOCK:
+        cached = _PARSE_CACHE.get(key)
+        if cached is not None:
+            _PARSE_CACHE.move_to_end(key)
+            return cached
+
+        # The syntactic pipeline is a superset of the orthographic one and yields the
+        # same lemmas, so an earlier syntactic parse of this text can be reused.
+        if linking_type == "orthographic":
+            cached = _PARSE_CACHE.get((text_hash, tool, "syntactic"))
+            if cached is not None:
+                _PARSE_CACHE.move_to_end((text_hash, tool, "syntactic"))
+                return (cached[0], ())
+
+    docs = _parse_documents(nlp, tool, linking_type, text)
+    lemmas, dependencies = _extract_tokens(docs, tool, with_dependencies=linking_type == "syntactic")
+    parsed = (tuple(lemmas), tuple(dependencies))
+
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE[key] = parsed
+        _PARSE_CACHE.move_to_end(key)
+        while len(_PARSE_CACHE) > PARSE_CACHE_SIZE:
+            _PARSE_CACHE.popitem(last=False)
+
+    return parsed
+
+
+def _orthographic_linking(lemmas: Iterable[str], stopwords_set: AbstractSet[str]) -> PhraseNet:
+    net = PhraseNet()
+
+    # Single sweep over the lemmas: drop stopwords and assign ids in order of first
+    # appearance, so edges point from the word seen earlier in the text.
+    vocab = {}
+    ids = np.fromiter(
+        (vocab.setdefault(lemma, len(vocab)) for lemma in lemmas if lemma not in stopwords_set),
+        dtype=np.int64,
+    )
+    net.labels = list(vocab)
+    net.freq = Counter(dict(enumerate(np.bincount(ids, minlength=len(vocab)).tolist())))
+
+    rows, cols, counts = _count_cooccurrences(ids, len(vocab), WINDOW_SIZE)
+    net.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), counts.tolist()))
+
+    return net
+
+
+def _syntactic_linking(
+    lemmas: Iterable[str], dependencies: Iterable[Tuple[str, str, str]], stopwords_set: AbstractSet[str]
+) -> PhraseNet:
+    net = PhraseNet()
+
+    vocab = {}
+    edge_weights = defaultdict(int)
+    relations = {}
+
+    for node_from, node_to, relation_type in dependencies:
+        if node_from in stopwords_set or node_to in stopwords_set:
+            continue
+
+        ids = []
+        for node in [node_from, node_to]:
+            node_id = vocab.get(node)
+            if node_id is None:
+                node_id = vocab[node] = len(net.labels)
+                net.labels.append(node)
+            ids.append(node_id)
 
-        if len(group) > 1:
-            equivalent_nodes.append(list(group))
+        edge = (ids[0], ids[1])
+        edge_weights[edge] += 1
+        # The first relation seen for an edge is the one kept.
+        relations.setdefault(edge, relation_type)
 
-    compressed_graph = nx.DiGraph()
-    node_map = {node: node for node in graph.nodes()}
+    # Frequencies are only needed for words that became nodes, so they are counted once
+    # the edges are known and every other lemma is skipped.
+    token_frequency = Counter(filter(vocab.__contains__, lemmas))
+    net.freq = Counter({node_id: token_frequency.get(node, 1) for node, node_id in vocab.items()})
+
+    net.rel = relations
+    net.add_weighted_edges_from((u, v, weight) for (u, v), weight in edge_weights.items())
+
+    return net
+
+
+def _filter_network(
+    net: PhraseNet, max_nodes: int, stopwords_set: AbstractSet[str] = frozenset()
+) -> PhraseNet:
+
+    labels = net.labels
+    # Super nodes only come out of compression and are never selected here. Labels are
+    # already lowercased lemmas, so they are matched against the stopwords as they are.
+    candidates = np.fromiter(
+        (node for node in net.freq if node not in net.groups and labels[node] not in stopwords_set),
+        dtype=np.int64,
+    )
+    if max_nodes <= 0 or not len(candidates):
+        return PhraseNet(labels=labels)
+
+    # Scores are the in + out edge weight totals, gathered into dense arrays.
+    strength = np.zeros(len(labels), dtype=np.int64)
+    for totals in (net.out_sum, net.in_sum):
+        nodes = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+        weights = np.fromiter(totals.values(), dtype=np.int64, count=len(totals))
+        strength[nodes] += weights
+    scores = strength[candidates]
+
+    if len(candidates) > max_nodes:
+        # Partitioning finds the max_nodes-th largest score in O(V). Nodes tied with it
+        # are taken in node order, so the selection matches a stable sort.
+        kth = len(scores) - max_nodes
+        threshold = np.partition(scores, kth)[kth]
+        above = candidates[scores > threshold]
+        tied = candidates[scores == threshold][: max_nodes - len(above)]
+        candidates = np.concatenate((above, tied))
+
+    return net.subgraph(candidates.tolist(), drop_isolates=True)
+
+
+def _compress_edges(net: PhraseNet) -> PhraseNet:
+
+    if not net.freq:
+        return net
+
+    # Topologically equivalent nodes share the same (predecessors, successors) signature.
+    preds = net.predecessors()
+    groups_by_signature = defaultdict(list)
+    for node in net.freq:
+        signature = (frozenset(preds.get(node, ())), frozenset(net.out.get(node, ())))
+        groups_by_signature[signature].append(node)
+
+    equivalent_nodes = [group for group in groups_by_signature.values() if len(group) > 1]
+
+    # Every signature is unique (common for small or sparse graphs): nothing to merge.
+    if not equivalent_nodes:
+        return net
+
+    compressed_net = PhraseNet(labels=list(net.labels))
+    node_map = {node: node for node in net.freq}
 
     for group in equivalent_nodes:
-        super_node_name = f"SUPER_NODE:{'|'.join(group)}"
+        super_node = len(compressed_net.labels)
+        compressed_net.labels.append(f"SUPER_NODE:{'|'.join(net.labels[n] for n in group)}")
         for node in group:
-            node_map[node] = super_node_name
+            node_map[node] = super_node
 
-        total_frequency = sum(graph.nodes[n].get("frequency", 1) for n in group)
-        compressed_graph.add_node(
-            super_node_name, group_members=group, frequency=total_frequency
-        )
+        compressed_net.freq[super_node] = sum(net.freq[n] for n in group)
+        compressed_net.groups[super_node] = group
+
+    for node, freq in net.freq.items():
+        if node_map[node] == node:
+            compressed_net.freq[node] = freq
+            if node in net.groups:
+                compressed_net.groups[node] = net.groups[node]
 
-    for u, v, data in graph.edges(data=True):
+    for u, v, weight in net.edges():
         u_new = node_map.get(u, u)
         v_new = node_map.get(v, v)
 
         if u_new != v_new:
-            weight = data.get("weight", 1)
-            if compressed_graph.has_edge(u_new, v_new):
-                compressed_graph[u_new][v_new]["weight"] += weight
-            else:
-                # Mantém a relação se for a primeira aresta
-                relation = data.get("relation") 
-                compressed_graph.add_edge(u_new, v_new, weight=weight, relation=relation)
-
-    return compressed_graph
+            # Mantém a relação da primeira aresta
+            compressed_net.add_edge(u_new, v_new, weight, net.rel.get((u, v)))
 
+    return compressed_net
 
-def _serialize_graph(graph: nx.DiGraph, stopwords: Optional[List[str]] = None) -> dict:
 
-    if stopwords is None:
-        stopwords = []
+def _serialize_graph(net: PhraseNet, stopwords_set: AbstractSet[str] = frozenset()) -> dict:
 
-    stopwords_set = set(w.lower() for w in stopwords)
+    labels = net.labels
+    in_degree = Counter(v for _, v, _ in net.edges())
 
     nodes = []
     valid_node_ids = set()
     
-    for n in graph.nodes():
-        if n.lower() in stopwords_set:
+    for n, frequency in net.freq.items():
+        # Super nodes are not serialized.
+        if n in net.groups:
             continue
-        if n.startswith("SUPER_NODE:"):
+        label = labels[n]
+        if label in stopwords_set:
             continue
 
-        frequency = graph.nodes[n].get("frequency", 1)
-        in_degree = graph.in_degree(n)
-        out_degree = graph.out_degree(n)
-        
         node_data = {
-            "id": n,
-            "label": n,
+            "id": label,
+            "label": label,
             "frequency": frequency,
-            "inDegree": in_degree,
-            "outDegree": out_degree,
+            "inDegree": in_degree[n],
+            "outDegree": len(net.out.get(n, ())),
         }
-        
-        if "group_members" in graph.nodes[n]:
-            node_data["group_members"] = graph.nodes[n]["group_members"]
             
         nodes.append(node_data)
         valid_node_ids.add(n)
 
     edges = []
-    for u, v, d in graph.edges(data=True):
+    for u, v, weight in net.edges():
         if u in valid_node_ids and v in valid_node_ids:
             edges.append({
-                "source": u, 
-                "target": v, 
-                "weight": d.get("weight", 1),
-                "relation": d.get("relation") 
+                "source": labels[u], 
+                "target": labels[v], 
+                "weight": weight,
+                "relation": net.rel.get((u, v)) 
             })
 
     return {
@@ -325,27 +672,36 @@ def run_phrase_net_analysis(
 
     if stopwords is None:
         stopwords = []
+
+    # Built once per analysis and shared read-only by every stage.
+    stopwords_set = frozenset(w.lower() for w in stopwords)
     
+    if linking_type not in STANZA_PROCESSORS:
+        raise ValueError("Invalid linking type. Use 'orthographic' or 'syntactic'.")
+
+    if linking_type == "orthographic":
+        if not pattern:
+            raise ValueError("The 'pattern' is mandatory for Orthographic Linking.")
+
     try:
-        load_nlp_pipeline(nlp_tool)
+        nlp = load_nlp_pipeline(nlp_tool)
     except (RuntimeError, ValueError) as e:
         raise e 
 
     text = _preprocess_text(raw_text)
+    lemmas, dependencies = _parse_to_tokens(nlp, nlp_tool, linking_type, text)
 
     if linking_type == "orthographic":
-        if not pattern:
-            raise ValueError("The 'pattern' is mandatory for Orthographic Linking.")
-        initial_graph = _orthographic_linking(text, pattern, stopwords)
+        initial_graph = _orthographic_linking(lemmas, stopwords_set)
     elif linking_type == "syntactic":
-        initial_graph = _syntactic_linking(text, stopwords)
+        initial_graph = _syntactic_linking(lemmas, dependencies, stopwords_set)
     else:
         raise ValueError("Invalid linking type. Use 'orthographic' or 'syntactic'.")
 
-    if not initial_graph.nodes:
-        return _serialize_graph(initial_graph, stopwords)
+    if not initial_graph.freq:
+        return _serialize_graph(initial_graph, stopwords_set)
 
-    filtered_graph = _filter_network(initial_graph, max_nodes, stopwords)
+    filtered_graph = _filter_network(initial_graph, max_nodes, stopwords_set)
     final_compressed_graph = _compress_edges(filtered_graph)
 
-    return _serialize_graph(final_compressed_graph, stopwords)
\ No newline at end of file
+    return _serialize_graph(final_compressed_graph, stopwords_set)
\ No newline at end of file
@@ -0,0 +1,70 @@
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+import phrase_net_core as core
+
+
+def _brute_force(ids, window_size):
+    counts = Counter()
+    for start in range(len(ids) - window_size + 1):
+        for a, b in combinations(set(ids[start:start + window_size]), 2):
+            counts[(min(a, b), max(a, b))] += 1
+    return counts
+
+
+def _as_counter(rows, cols, counts):
+    totals = Counter()
+    for r, c, n in zip(rows, cols, counts):
+        totals[(int(r), int(c))] += int(n)
+    return totals
+
+
+def _random_ids(seed, num_tokens=300, vocab_size=25):
+    return np.random.default_rng(seed).integers(0, vocab_size, size=num_tokens).astype(np.int64)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("window_size", [2, 3, 5, 8])
+@pytest.mark.parametrize("dense", [True, False])
+def test_count_cooccurrences_matches_brute_force(monkeypatch, seed, window_size, dense):
+    if not dense:
+        monkeypatch.setattr(core, "DENSE_COOCCURRENCE_MAX_CELLS", 0)
+    ids = _random_ids(seed)
+
+    result = core._count_cooccurrences(ids, 25, window_size)
+
+    assert _as_counter(*result) == _brute_force(ids.tolist(), window_size)
+
+
+@pytest.mark.parametrize("window_size", [2, 5])
+def test_count_cooccurrences_numpy_kernel(monkeypatch, window_size):
+    monkeypatch.setattr(core, "njit", None)
+    ids = _random_ids(42)
+
+    result = core._count_cooccurrences(ids, 25, window_size)
+
+    assert _as_counter(*result) == _brute_force(ids.tolist(), window_size)
+
+
+def test_count_cooccurrences_short_text():
+    rows, cols, counts = core._count_cooccurrences(np.array([0, 1], dtype=np.int64), 2, 5)
+    assert len(rows) == len(cols) == len(counts) == 0
+
+
+@pytest.mark.skipif(core.njit is None, reason="numba is not installed")
+@pytest.mark.parametrize("seed", range(3))
+def test_pair_span_kernels_agree(seed):
+    ids = _random_ids(seed, num_tokens=500, vocab_size=40)
+    window_size = 6
+    order = np.argsort(ids, kind="stable")
+    repeated = ids[order[1:]] == ids[order[:-1]]
+    previous = np.full(len(ids), -1, dtype=np.int64)
+    previous[order[1:][repeated]] = order[:-1][repeated]
+
+    numba_result = core._pair_spans_numba(ids, previous, window_size)
+    numpy_result = core._pair_spans_numpy(ids, previous, window_size)
+
+    assert _as_counter(*numba_result) == _as_counter(*numpy_result)
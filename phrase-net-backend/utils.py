@@ -1,26 +1,147 @@
 from PyPDF2 import PdfReader
+import asyncio
 import io
 import mimetypes
-from typing import IO
+import mmap
+import os
+import shutil
+import tempfile
+from typing import IO, Awaitable, Callable, Optional, Union
 
+# PDFium (Chromium's native PDF engine) extracts text much faster than PyPDF2's
+# pure-Python parser. Falls back to PyPDF2 when pypdfium2 isn't installed.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
-async def extract_text_from_source(file_stream: IO[bytes], filename: str) -> str:
+# Non-seekable streams are spooled before PDF parsing; above this size they spill to disk.
+SPOOL_MAX_SIZE = 10_000_000
+
+# Large PDFs are split into page ranges extracted in parallel by the analysis worker
+# processes; below this many pages the extra round trips don't pay off.
+PDF_PARALLEL_MIN_PAGES = 16
+
+
+def _ensure_seekable(file_stream: IO[bytes]) -> IO[bytes]:
+    if file_stream.seekable():
+        return file_stream
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    shutil.copyfileobj(file_stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def _read_utf8(file_stream: IO[bytes]) -> str:
+    # Disk-backed uploads are decoded straight from a memory map, so the file is never
+    # copied into an intermediate bytes object. Spooled files only have a descriptor once
+    # rolled to disk; asking for one earlier would force the rollover.
+    if getattr(file_stream, "_rolled", True):
+        try:
+            fileno = file_stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+
+        if fileno is not None:
+            file_stream.flush()
+            offset = file_stream.tell()
+            if os.fstat(fileno).st_size <= offset:
+                return ""
+            with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+                return str(memoryview(mapped)[offset:], "utf-8")
+
+    return file_stream.read().decode("utf-8")
+
+
+def _pdf_page_count(source: Union[IO[bytes], str]) -> int:
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    return len(PdfReader(source).pages)
+
+
+def _extract_pdf_pages(source: Union[IO[bytes], str], start: int = 0, stop: Optional[int] = None) -> str:
+    # `source` is a seekable stream, or the path of the PDF on disk when pages are
+    # extracted in a worker process.
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            pages = []
+            for index in range(len(pdf))[start:stop]:
+                page = pdf[index]
+                text_page = page.get_textpage()
+                pages.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+            return "".join(pages)
+        finally:
+            pdf.close()
+
+    reader = PdfReader(source)
+    pages = []
+    for index in range(len(reader.pages))[start:stop]:
+        pages.append(reader.pages[index].extract_text() or "")
+    return "".join(pages)
+
+
+def _copy_to_file(source: IO[bytes], target: IO[bytes]):
+    shutil.copyfileobj(source, target)
+    target.flush()
+
+
+async def _extract_pdf_text(
+    file_stream: IO[bytes], run_in_worker: Optional[Callable[..., Awaitable]] = None, workers: int = 1
+) -> str:
+    if run_in_worker is None:
+        return _extract_pdf_pages(_ensure_seekable(file_stream))
+
+    # Workers reopen the PDF from a temporary file, so the upload is never read into
+    # memory or pickled; the copy, page count and extraction all run off the event loop.
+    loop = asyncio.get_running_loop()
+    pdf_file = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    try:
+        with pdf_file:
+            await loop.run_in_executor(None, _copy_to_file, file_stream, pdf_file)
+
+        page_count = await run_in_worker(_pdf_page_count, pdf_file.name)
+        if workers == 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            return await run_in_worker(_extract_pdf_pages, pdf_file.name)
+
+        # Pages are independent, so the document is split into one contiguous page range
+        # per worker; run_in_worker hands each range to the least busy worker.
+        pages_per_worker = -(-page_count // workers)
+        parts = await asyncio.gather(*(
+            run_in_worker(_extract_pdf_pages, pdf_file.name, start, start + pages_per_worker)
+            for start in range(0, page_count, pages_per_worker)
+        ))
+        return "".join(parts)
+    finally:
+        os.unlink(pdf_file.name)
+
+
+async def extract_text_from_source(
+    file_stream: IO[bytes],
+    filename: str,
+    run_in_worker: Optional[Callable[..., Awaitable]] = None,
+    workers: int = 1,
+) -> str:
     
     mime_type, _ = mimetypes.guess_type(filename)
 
     if mime_type == "application/pdf":
         try:
-            reader = PdfReader(file_stream)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-            return text
+            return await _extract_pdf_text(file_stream, run_in_worker, workers)
         except Exception as e:
             raise IOError("Could not extract text from the PDF file.")
 
     elif mime_type == "text/plain" or filename.endswith(".txt"):
         try:
-            return file_stream.read().decode("utf-8")
+            return await asyncio.get_running_loop().run_in_executor(None, _read_utf8, file_stream)
         except Exception as e:
             raise IOError("Could not read the TXT file.")
 